@@ -1,21 +1,63 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import functools
 import os
-import requests
+import re
+import time
+import types
+import msgspec
+import orjson
 import spacy
 import httpx
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=100,
+    minPoolSize=10,
+    serverSelectionTimeoutMS=2000,
+    retryWrites=True,
+    uuidRepresentation="standard",
+)
 db = client["WeebRaphael"]  
 users_collection = db["users"]  
 
-app = FastAPI()
+http_client = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    await db.command("ping")
+    await users_collection.create_index("username", unique=True)
+    http_client = httpx.AsyncClient(
+        timeout=10,
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=2,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        ),
+    )
+    # First real request should not pay the tokenizer's lazy init or
+    # the DNS + TLS handshake to AniList; a GET is rejected by the
+    # GraphQL endpoint but still warms the connection.
+    extract_keywords("warmup")
+    if ANILIST_API_URL:
+        try:
+            await http_client.get(ANILIST_API_URL)
+        except httpx.HTTPError:
+            pass
+    yield
+    await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.get("/test-db")
 async def test_db_connection():
@@ -25,11 +67,15 @@ async def test_db_connection():
     except Exception as e:
         return {"error": str(e)}
 
-nlp = spacy.load("en_core_web_sm")
+# Genre spotting is handled by the compiled pattern below and /search
+# only needs the content words of the query, so a blank tokenizer-only
+# pipeline replaces en_core_web_sm — no neural forward pass, no model
+# weights in memory.
+nlp = spacy.blank("en")
 
 ANILIST_API_URL = os.getenv("ANILIST_API_URL")
 
-GENRE_MAPPING = {
+GENRE_MAPPING = types.MappingProxyType({
     "action": "Action",
     "adventure": "Adventure",
     "comedy": "Comedy",
@@ -48,138 +94,223 @@ GENRE_MAPPING = {
     "psychological": "Psychological",
     "supernatural": "Supernatural",
     "magic": "Magic"
-}
+})
+
+_KEYWORD_CACHE_MAX = 4096
+_keyword_cache = {}
+
+def _keywords_from_doc(doc):
+    return tuple(
+        token.text for token in doc
+        if token.is_alpha and not token.is_stop
+    )
+
+def _cache_keywords(text, keywords):
+    if len(_keyword_cache) >= _KEYWORD_CACHE_MAX:
+        _keyword_cache.clear()
+    _keyword_cache[text] = keywords
 
 def extract_keywords(user_input: str):
-    doc = nlp(user_input)
-    
-    adjectives = []
-    nouns = []
-
-    for token in doc:
-        if token.pos_ == "ADJ":
-            adjectives.append(token.text)
-        elif token.pos_ == "NOUN":
-            nouns.append(token.text)
-
-    return adjectives, nouns
-
-def map_to_genres(keywords):
-    genres = []
-    for keyword in keywords:
-        if keyword in GENRE_MAPPING:
-            genres.append(GENRE_MAPPING[keyword])
+    text = user_input.strip()
+    cached = _keyword_cache.get(text)
+    if cached is not None:
+        return cached
+    keywords = _keywords_from_doc(nlp(text))
+    _cache_keywords(text, keywords)
+    return keywords
+
+# One compiled alternation over all genre keywords scans the raw query
+# in a single C-level pass — no tagging, no per-token Python loop.
+_GENRE_PATTERN = re.compile(
+    r"\b(?:"
+    + "|".join(sorted(map(re.escape, GENRE_MAPPING), key=len, reverse=True))
+    + r")\b"
+)
+
+@functools.lru_cache(maxsize=1024)
+def map_query_to_genres(user_input: str):
+    genres = {GENRE_MAPPING[match] for match in _GENRE_PATTERN.findall(user_input.lower())}
     if not genres:
-        genres = ["Action", "Adventure"]
-    return genres
-
-async def fetch_anime_recommendations(genre: list):
-    query = """
-    query ($genres: [String], $perPage: Int) {
-        Page(page: 1, perPage: $perPage) {
-            media (genre_in: $genres, type: ANIME, sort: POPULARITY_DESC) {
-                title {
-                    romaji
-                    english
-                }
-                description
-                genres
-                coverImage {
-                    large
-                }
-                siteUrl
-                averageScore
+        return ("Action", "Adventure")
+    return tuple(genres)
+
+# AniList answers for a given genre set or search string barely change
+# minute to minute, so results are kept for a while and served from
+# memory instead of repeating the ~200 ms GraphQL round-trip.
+_ANILIST_CACHE_TTL = 600
+_ANILIST_CACHE_MAX = 512
+_anilist_cache = {}
+
+def _anilist_cache_get(key):
+    entry = _anilist_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, media = entry
+    if time.monotonic() >= expires_at:
+        del _anilist_cache[key]
+        return None
+    return media
+
+def _anilist_cache_put(key, media):
+    if len(_anilist_cache) >= _ANILIST_CACHE_MAX:
+        _anilist_cache.clear()
+    _anilist_cache[key] = (time.monotonic() + _ANILIST_CACHE_TTL, media)
+
+_RECOMMEND_QUERY = """
+query ($genres: [String], $perPage: Int) {
+    Page(page: 1, perPage: $perPage) {
+        media (genre_in: $genres, type: ANIME, sort: POPULARITY_DESC) {
+            title {
+                romaji
+                english
             }
+            description
+            genres
+            coverImage {
+                large
+            }
+            siteUrl
+            averageScore
         }
     }
-    """
-
-    variables = {
-        "genres": genre, 
-        "perPage": 10
+}
+"""
+
+_SEARCH_QUERY = """
+query ($search: String, $perPage: Int) {
+    Page(page: 1, perPage: $perPage) {
+        media(search: $search, type: ANIME) {
+            title {
+                romaji
+                english
+            }
+            description
+            genres
+            coverImage {
+                large
+            }
+            siteUrl
+            averageScore
+        }
     }
+}
+"""
+
+# The query text never changes, so its share of the outbound body is
+# serialized once; per call only the small variables dict is encoded
+# and spliced in.
+_RECOMMEND_BODY_PREFIX = b'{"query":' + orjson.dumps(_RECOMMEND_QUERY) + b',"variables":'
+_SEARCH_BODY_PREFIX = b'{"query":' + orjson.dumps(_SEARCH_QUERY) + b',"variables":'
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+# Typed views over the AniList payload: msgspec decodes straight into
+# these structs, materializing only the fields the endpoints return
+# instead of json.loads building dicts for the whole response.
+class _MediaTitle(msgspec.Struct):
+    romaji: str | None = None
+
+class _MediaCover(msgspec.Struct):
+    large: str | None = None
+
+class _Media(msgspec.Struct):
+    title: _MediaTitle | None = None
+    description: str | None = None
+    genres: tuple[str, ...] | None = None
+    coverImage: _MediaCover | None = None
+    siteUrl: str | None = None
+
+class _MediaPage(msgspec.Struct):
+    media: tuple[_Media, ...] = ()
+
+class _PageData(msgspec.Struct):
+    Page: _MediaPage | None = None
+
+class _AniListResponse(msgspec.Struct):
+    data: _PageData | None = None
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(ANILIST_API_URL, json={"query": query, "variables": variables})
-        if response.status_code == 200:
-            data = response.json()
-            if "data" in data and "Page" in data["data"] and "media" in data["data"]["Page"]:
-                return data["data"]["Page"]["media"]
-        return []
+_anilist_decoder = msgspec.json.Decoder(_AniListResponse)
+
+def _decode_media(payload: bytes):
+    try:
+        decoded = _anilist_decoder.decode(payload)
+    except msgspec.DecodeError:
+        return ()
+    if decoded.data is None or decoded.data.Page is None:
+        return ()
+    return decoded.data.Page.media
+
+def _media_to_response(anime_list):
+    return [
+        {
+            "title": anime.title.romaji if anime.title else None,
+            "description": anime.description,
+            "genres": anime.genres or (),
+            "coverImage": anime.coverImage.large if anime.coverImage else None,
+            "siteUrl": anime.siteUrl
+        }
+        for anime in anime_list
+    ]
+
+async def fetch_anime_recommendations(genre: str):
+    cache_key = ("recommend", genre)
+    cached = _anilist_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = _RECOMMEND_BODY_PREFIX + orjson.dumps({"genres": [genre], "perPage": 10}) + b"}"
+    response = await http_client.post(ANILIST_API_URL, content=body, headers=_JSON_HEADERS)
+    if response.status_code == 200:
+        media = _decode_media(response.content)
+        if media:
+            _anilist_cache_put(cache_key, media)
+        return media
+    return ()
 
 @app.get("/recommend")
 async def get_recommendations(genre: str):
-    adjectives, nouns = extract_keywords(genre)
+    mapped_genres = map_query_to_genres(genre)
 
-    all_keywords = adjectives + nouns
+    results = await asyncio.gather(
+        *(fetch_anime_recommendations(genre) for genre in mapped_genres)
+    )
 
-    mapped_genres = map_to_genres(all_keywords)
+    anime_list = []
+    seen_urls = set()
+    for media in results:
+        for anime in media:
+            if anime.siteUrl not in seen_urls:
+                seen_urls.add(anime.siteUrl)
+                anime_list.append(anime)
 
-    anime_list = await fetch_anime_recommendations(mapped_genres)
     if anime_list:
-        return [
-            {
-                "title": anime["title"]["romaji"],
-                "description": anime["description"],
-                "genres": anime["genres"],
-                "coverImage": anime["coverImage"]["large"],
-                "siteUrl": anime["siteUrl"]
-            }
-            for anime in anime_list
-        ]
+        return _media_to_response(anime_list)
     raise HTTPException(status_code=404, detail="No recommendations found")
 
 async def fetch_anime_search(query: str):
-    search_query = """
-    query ($search: String, $perPage: Int) {
-        Page(page: 1, perPage: $perPage) {
-            media(search: $search, type: ANIME) {
-                title {
-                    romaji
-                    english
-                }
-                description
-                genres
-                coverImage {
-                    large
-                }
-                siteUrl
-                averageScore
-            }
-        }
-    }
-    """
-    variables = {
-        "search": query,
-        "perPage": 5 
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(ANILIST_API_URL, json={"query": search_query, "variables": variables})
-        if response.status_code == 200:
-            data = response.json()
-            if "data" in data and "Page" in data["data"] and "media" in data["data"]["Page"]:
-                return data["data"]["Page"]["media"]
-        return []
+    cache_key = ("search", query)
+    cached = _anilist_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = _SEARCH_BODY_PREFIX + orjson.dumps({"search": query, "perPage": 5}) + b"}"
+    response = await http_client.post(ANILIST_API_URL, content=body, headers=_JSON_HEADERS)
+    if response.status_code == 200:
+        media = _decode_media(response.content)
+        if media:
+            _anilist_cache_put(cache_key, media)
+        return media
+    return ()
 
 @app.get("/search")
 async def search_anime(query: str):
-    adjectives, nouns = extract_keywords(query)
+    keywords = extract_keywords(query)
 
-    search_query = " ".join(nouns)
+    search_query = " ".join(keywords)
 
     anime_list = await fetch_anime_search(search_query)
     if anime_list:
-        return [
-            {
-                "title": anime["title"]["romaji"],
-                "description": anime["description"],
-                "genres": anime["genres"],
-                "coverImage": anime["coverImage"]["large"],
-                "siteUrl": anime["siteUrl"]
-            }
-            for anime in anime_list
-        ]
+        return _media_to_response(anime_list)
     raise HTTPException(status_code=404, detail="No anime found matching that query")
 
 class UserCreate(BaseModel):
@@ -196,7 +327,7 @@ class WatchHistory(BaseModel):
     title: str
 
 async def create_user(user: UserCreate):
-    existing_user = await users_collection.find_one({"username": user.username})
+    existing_user = await users_collection.find_one({"username": user.username}, {"_id": 1})
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
 
@@ -219,23 +350,24 @@ async def get_user(username: str):
 
 @app.post("/users/{username}/favorites")
 async def add_favorite(username: str, anime: FavoriteAnime):
-    user = await users_collection.find_one({"username": username})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    anime_entry = {"anime_id": anime.anime_id, "title": anime.title, "added_at": datetime.utcnow().isoformat()}
-    await users_collection.update_one(
+    anime_entry = {"anime_id": anime.anime_id, "title": anime.title, "added_at": datetime.utcnow()}
+    result = await users_collection.update_one(
         {"username": username}, {"$push": {"favorites": anime_entry}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
     return {"message": "Anime added to favorites"}
 
 async def add_watch_history(username: str, anime: WatchHistory):
-    user = await users_collection.find_one({"username": username})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    history_entry = {"anime_id": anime.anime_id, "title": anime.title, "watched_at": datetime.utcnow().isoformat()}
-    await users_collection.update_one(
+    history_entry = {"anime_id": anime.anime_id, "title": anime.title, "watched_at": datetime.utcnow()}
+    result = await users_collection.update_one(
         {"username": username}, {"$push": {"watch_history": history_entry}}
     )
-    return {"message": "Anime added to watch history"}
\ No newline at end of file
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "Anime added to watch history"}
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")